@@ -1,6 +1,9 @@
 import os
+import sys
 import threading
 import queue
+import selectors
+from collections import deque
 from .chat_logic import ChatClient  # Import networking logic
 
 
@@ -8,6 +11,35 @@ def _on_message_received(sender, text):
     print(f"{sender}: {text}")
 
 
+def _write_file_chunks(fh, chunks: queue.Queue):
+    """
+    Writer thread: write the chunks queued in `chunks` to `fh` until the None sentinel,
+    then make the file durable (flush + fsync) and close it.
+    Keeps disk I/O off the network receiver thread.
+    """
+    failed = False
+    try:
+        while (data := chunks.get()) is not None:
+            if failed:
+                continue  # Keep draining so the receiver never blocks on a full queue
+            try:
+                fh.write(data)
+            except OSError as e:
+                failed = True
+                print(f"[Error] Failed to write '{fh.name}': {e}")
+        if not failed:
+            try:
+                fh.flush()
+                os.fsync(fh.fileno())
+            except OSError as e:
+                print(f"[Error] Failed to write '{fh.name}': {e}")
+    finally:
+        try:
+            fh.close()
+        except OSError:
+            pass  # Flushing the rest of the buffer failed the same way: already reported
+
+
 class ChatConsoleUI:
     """
     Console UI for chat:
@@ -18,12 +50,38 @@ class ChatConsoleUI:
 
     def __init__(self, server_host: str, server_port: int):
         self.username = None
-        self._receiving_files = {}  # (sender, filename) -> save_path
+        self._receiving_files = {}  # (sender, filename) -> chunk queue of the file's writer thread
         self._pending_file_send = None  # (to_user, file_path, filename)
         self.running = True
-        self._event_queue = queue.Queue()
+        self._event_queue = deque()  # filled by the receiver thread, drained by the input loop
+        self._setup_wakeup()
         self._setup_networking(server_host, server_port)
 
+    def _setup_wakeup(self):
+        """
+        Let the input loop sleep until either stdin has a line or an event is queued:
+        callbacks write a byte into a pipe watched by the same selector as stdin.
+        """
+        self._selector = None
+        self._wakeup_r, self._wakeup_w = None, None
+        if os.name == "nt":
+            # select() only supports sockets on Windows: fall back to blocking input()
+            return
+        # stdin is read from its fd, not through sys.stdin: lines left in Python's
+        # buffer would not wake the selector
+        selector = selectors.DefaultSelector()
+        try:
+            self._stdin_fd = sys.stdin.fileno()
+            selector.register(self._stdin_fd, selectors.EVENT_READ)
+        except OSError:
+            # No pollable stdin (e.g. a regular file or /dev/null): fall back to input()
+            selector.close()
+            return
+        self._stdin_buf = bytearray()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._selector = selector
+
     def _setup_networking(self, server_host: str, server_port: int):
         self.chat_client = ChatClient(server_host, server_port, ping_interval=60)
         self.chat_client.on_connect_result = self._on_connect_result
@@ -52,15 +110,15 @@ class ChatConsoleUI:
         while self.running:
             # If there is an event, process it immediately
             try:
-                event = self._event_queue.get(timeout=0.1)
+                event = self._event_queue.popleft()
                 if event[0] == 'file_request':
                     sender, filename, filesize, filetype = event[1:]
                     print(f"User {sender} offers to send file '{filename}' ({filesize} bytes, type {filetype}). "
                           f"Accept? (y/n)")
                     while True:
-                        ans = input('> ').strip().lower()
+                        ans = self._input('> ').strip().lower()
                         if ans == 'y':
-                            save_dir = input("Enter directory path to save the file: ").strip()
+                            save_dir = self._input("Enter directory path to save the file: ").strip()
                             if not save_dir or not os.path.isdir(save_dir):
                                 print("[Error] Directory not found. Refused.")
                                 self.chat_client.send_file_cancel(sender, filename, "User canceled the file selection")
@@ -68,7 +126,15 @@ class ChatConsoleUI:
                                       f"not selected)")
                                 break
                             save_path = os.path.join(save_dir, filename)
-                            self._receiving_files[(sender, filename)] = save_path
+                            try:
+                                fh = open(save_path, "wb", buffering=1024 * 1024)
+                            except OSError as e:
+                                print(f"[Error] Cannot create '{save_path}': {e}. Refused.")
+                                self.chat_client.send_file_cancel(sender, filename, "Receiver cannot save the file")
+                                break
+                            chunks = queue.Queue(maxsize=32)
+                            threading.Thread(target=_write_file_chunks, args=(fh, chunks), daemon=True).start()
+                            self._receiving_files[(sender, filename)] = chunks
                             self.chat_client.send_file_accept(sender, filename)
                             print(f"[Success] {sender} -> {self.username}: file accepted '{filename}'")
                             break
@@ -79,26 +145,26 @@ class ChatConsoleUI:
                         else:
                             print("Enter 'y' or 'n'.")
                     continue  # After event, check for more events before prompting for command
-            except queue.Empty:
+            except IndexError:
                 pass  # No event, proceed to command input
 
             # If no event, prompt for command
             try:
-                cmd = input('> ').strip()
+                cmd = self._read_command()
             except EOFError:
                 self.running = False
                 break
             if not cmd:
-                continue
-            parts = cmd.split()
+                continue  # Empty line, or woken up by an event
+            # The message text / file path is kept verbatim as the third part
+            parts = cmd.split(maxsplit=2)
             if not parts:
                 continue
             command = parts[0].lower()
             if command == 'connect' and len(parts) == 2:
                 self._try_connect(parts[1])
-            elif command == 'send' and len(parts) >= 3:
-                to_user = parts[1]
-                text = ' '.join(parts[2:])
+            elif command == 'send' and len(parts) == 3:
+                to_user, text = parts[1], parts[2]
                 self._send_message(to_user, text)
             elif command == 'sendfile' and len(parts) == 3:
                 to_user = parts[1]
@@ -111,6 +177,63 @@ class ChatConsoleUI:
             else:
                 print("Unknown command or invalid arguments.")
 
+    def _read_command(self):
+        """
+        Prompt for a command and wait until either it is entered or an event is queued.
+        Returns the stripped command line, or None if woken up by an event.
+        Raises EOFError when stdin is closed.
+        """
+        if self._selector is None:
+            return input('> ').strip()
+        print('> ', end='', flush=True)
+        while (line := self._pop_stdin_line()) is None:
+            ready = {key.fileobj for key, _ in self._selector.select()}
+            if self._wakeup_r in ready:
+                os.read(self._wakeup_r, 512)
+            if self._stdin_fd not in ready:
+                print()
+                return None
+            self._fill_stdin_buffer()
+        return line.strip()
+
+    def _input(self, prompt):
+        """
+        input() that shares the stdin buffer of _read_command.
+        """
+        if self._selector is None:
+            return input(prompt)
+        print(prompt, end='', flush=True)
+        while (line := self._pop_stdin_line()) is None:
+            self._fill_stdin_buffer()
+        return line.rstrip('\n')
+
+    def _pop_stdin_line(self):
+        """
+        Remove and return the first complete line of the stdin buffer, or None if there is none.
+        """
+        end = self._stdin_buf.find(b'\n') + 1
+        if not end:
+            return None
+        line = self._stdin_buf[:end].decode(sys.stdin.encoding or 'utf-8', errors='replace')
+        del self._stdin_buf[:end]
+        return line
+
+    def _fill_stdin_buffer(self):
+        """
+        Append whatever stdin has (one read) to the stdin buffer.
+        Raises EOFError when stdin is closed and the buffer is empty.
+        """
+        data = os.read(self._stdin_fd, 65536)
+        if not data:
+            if not self._stdin_buf:
+                raise EOFError
+            data = b'\n'  # Terminate the last, unterminated line
+        self._stdin_buf += data
+
+    def _wake_input_loop(self):
+        if self._wakeup_w is not None:
+            os.write(self._wakeup_w, b"x")
+
     def _try_connect(self, username):
         if self.chat_client.running:
             print("[Info] Already connected.")
@@ -135,6 +258,11 @@ class ChatConsoleUI:
     def _on_disconnected(self):
         print("*** Disconnected from server ***")
         self.username = None
+        # No more chunks will come: stop the writers of unfinished transfers
+        receiving, self._receiving_files = self._receiving_files, {}
+        for (sender, filename), chunks in receiving.items():
+            chunks.put(None)
+            print(f"[Error] File transfer '{filename}' from {sender} interrupted.")
 
     def _send_message(self, to_user, text):
         if not self.chat_client.running:
@@ -156,8 +284,13 @@ class ChatConsoleUI:
         print(f"Me -> {to_user}: sending file '{filename}'...")
 
     def _on_file_request(self, sender, filename, filesize, filetype):
-        print(f"\n[Incoming file request from {sender}! Press Enter to respond.]")
-        self._event_queue.put(('file_request', sender, filename, filesize, filetype))
+        if self._selector is None:
+            # The input loop is blocked in input() until the user presses Enter
+            print(f"\n[Incoming file request from {sender}! Press Enter to respond.]")
+        else:
+            print(f"\n[Incoming file request from {sender}!]")
+        self._event_queue.append(('file_request', sender, filename, filesize, filetype))
+        self._wake_input_loop()
 
     def _on_file_accept(self, sender, filename):
         print(f"{sender} accepted file '{filename}'.")
@@ -179,16 +312,20 @@ class ChatConsoleUI:
 
     def _on_file_data(self, sender, filename, data, is_last_chunk):
         key = (sender, filename)
-        save_path = self._receiving_files.get(key)
-        if not save_path:
+        chunks = self._receiving_files.get(key)
+        if not chunks:
             print(f"[Error] Unknown file '{filename}' from {sender}, chunk ignored.")
             return
-        with open(save_path, "ab") as f:
-            f.write(data)
+        chunks.put(data)
         if is_last_chunk:
             del self._receiving_files[key]
+            chunks.put(None)
 
     def _on_file_complete(self, sender, filename):
+        # Empty files have no last chunk: stop their writer here
+        chunks = self._receiving_files.pop((sender, filename), None)
+        if chunks:
+            chunks.put(None)
         print(f"[Success] {sender} -> {self.username}: file transfer '{filename}' completed.")
 
     def _request_users(self):
@@ -201,18 +338,9 @@ class ChatConsoleUI:
             self.chat_client.disconnect()
         print("[Info] Exiting.")
 
-    def _send_file_chunks(self, to_user, file_path, filename, chunk_size=4096):
+    def _send_file_chunks(self, to_user, file_path, filename, chunk_size=65536):
         try:
-            with open(file_path, "rb") as f:
-                chunk_index = 0
-                while True:
-                    data = f.read(chunk_size)
-                    if not data:
-                        break
-                    is_last = f.tell() == os.path.getsize(file_path)
-                    self.chat_client.send_file_data(to_user, filename, chunk_index, data, is_last)
-                    chunk_index += 1
-            self.chat_client.send_file_complete(to_user, filename)
+            self.chat_client.send_file(to_user, file_path, filename, chunk_size)
         except Exception as e:
             print(f"[Error] Failed to send file '{filename}': {e}")
 
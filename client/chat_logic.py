@@ -1,12 +1,25 @@
 import socket
+import selectors
 import threading
-import json
+import queue
 import time
 import protocol
 import os
-import base64
 import mimetypes
 
+_loads = protocol.loads
+_dumps_line = protocol.dumps_line
+
+# Pings never change: serialize once
+_PING_LINE = _dumps_line(protocol.build_ping())
+
+# Size of the send buffer. Queued items at least this large bypass it, see ChatClient._send_loop
+_SEND_BUFFER_SIZE = 65536
+
+
+def _ignore(*args, **kwargs):
+    """Default for callbacks the UI did not set."""
+
 
 class ChatClient:
     """
@@ -17,46 +30,75 @@ class ChatClient:
       - invoking application-level callbacks on events
     """
 
+    # Whether send_file can hand file bytes to the kernel without copying them through Python
+    can_sendfile = hasattr(os, "sendfile")
+    # Whether large queued frames can be sent with scatter-gather I/O (not on Windows)
+    can_sendmsg = hasattr(socket.socket, "sendmsg")
+
     def __init__(self, server_host: str, server_port: int, ping_interval: int = 60):
         self.server_host = server_host
         self.server_port = server_port
         self.ping_interval = ping_interval
 
         self.sock = None
-        self.sock_file = None
+        self.sock_selector = None  # lets the receiver wait for data with a timeout
+        # Receive buffer, filled with recv_into() up to _recv_end and parsed up to _recv_pos
+        self._recv_buf = bytearray(262144)
+        self._recv_view = memoryview(self._recv_buf)
+        self._recv_pos = 0
+        self._recv_end = 0
+        self.sock_wfile = None  # buffered writer, shared by all sending threads
+        self._send_lock = threading.Lock()  # keeps each message contiguous in sock_wfile
+        self._send_queue = None  # (parts, flush) items written in order by the sender thread
+        self._ping_pending = False  # ping to be written by the sender thread once the queue has room
 
         self.running = False  # Indicates whether background threads should keep running
         self.receiver_thread = None
-        self.pinger_thread = None
-
-        # Application‐level callbacks (to be set by UI)
-        self.on_connect_result = None  # signature: fn(success: bool, error: str|None)
-        self.on_message_received = None  # signature: fn(sender: str, text: str)
-        self.on_user_list_updated = None  # signature: fn(list_of_users: list[str])
-        self.on_error = None  # signature: fn(error_text: str)
-        self.on_disconnected = None  # signature: fn()
-
-        # File transfer callbacks (to be set by UI)
-        self.on_file_request = None  # signature: fn(sender: str, filename: str, filesize: int, filetype: str)
-        self.on_file_accept = None  # signature: fn(sender: str, filename: str)
-        self.on_file_cancel = None  # signature: fn(sender: str, filename: str, reason: str)
-        self.on_file_data = None  # signature: fn(sender: str, filename: str, chunk_index: int, data: bytes, is_last_chunk: bool)
-        self.on_file_complete = None  # signature: fn(sender: str, filename: str)
+        self.sender_thread = None
+
+        # Application‐level callbacks (to be set by UI), no-ops until then
+        self.on_connect_result = _ignore  # signature: fn(success: bool, error: str|None)
+        self.on_message_received = _ignore  # signature: fn(sender: str, text: str)
+        self.on_user_list_updated = _ignore  # signature: fn(list_of_users: list[str])
+        self.on_error = _ignore  # signature: fn(error_text: str)
+        self.on_disconnected = _ignore  # signature: fn()
+
+        # File transfer callbacks (to be set by UI), no-ops until then
+        self.on_file_request = _ignore  # signature: fn(sender: str, filename: str, filesize: int, filetype: str)
+        self.on_file_accept = _ignore  # signature: fn(sender: str, filename: str)
+        self.on_file_cancel = _ignore  # signature: fn(sender: str, filename: str, reason: str)
+        self.on_file_data = _ignore  # signature: fn(sender: str, filename: str, data: bytes, is_last_chunk: bool)
+        self.on_file_complete = _ignore  # signature: fn(sender: str, filename: str)
+
+        # Incoming action -> handler, see _receive_loop
+        self._dispatch = {
+            protocol.ACTION_MESSAGE: self._handle_message,
+            protocol.ACTION_USER_LIST: self._handle_user_list,
+            protocol.ACTION_ERROR: self._handle_error,
+            protocol.ACTION_FILE_REQUEST: self._handle_file_request,
+            protocol.ACTION_FILE_ACCEPT: self._handle_file_accept,
+            protocol.ACTION_FILE_CANCEL: self._handle_file_cancel,
+            protocol.ACTION_FILE_DATA: self._handle_file_data,
+            protocol.ACTION_FILE_COMPLETE: self._handle_file_complete,
+        }
 
     def connect(self, username: str):
         """
         Attempt to establish a TCP connection and send {"action":"connect","username":...}.
         After reading the server's response, invoke on_connect_result(success, error).
-        If successful, start background receiver and ping threads.
+        If successful, start the background receiver thread (which also sends pings).
         """
         try:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sock.connect((self.server_host, self.server_port))
-            self.sock_file = self.sock.makefile(mode='r', encoding='utf-8')
+            # Writes are already coalesced by sock_wfile and flushed per message:
+            # don't let Nagle hold back small interactive messages on top of that
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._recv_pos = self._recv_end = 0
+            self.sock_wfile = self.sock.makefile(mode='wb', buffering=_SEND_BUFFER_SIZE)
         except Exception as e:
             # Failed to connect at all
-            if self.on_connect_result:
-                self.on_connect_result(False, f"Cannot connect to server: {e}")
+            self.on_connect_result(False, f"Cannot connect to server: {e}")
             return
 
         # Send the "connect" request
@@ -64,39 +106,38 @@ class ChatClient:
         try:
             self._send_json(payload)
         except Exception as e:
-            if self.on_connect_result:
-                self.on_connect_result(False, f"Send error: {e}")
+            self.on_connect_result(False, f"Send error: {e}")
             self.sock.close()
             return
 
         # Wait synchronously for a single response line
         try:
-            response_line = self.sock_file.readline()
-            if not response_line:
+            resp, _ = self._read_message()
+            if resp is None:
                 raise Exception("No response from server.")
-            resp = json.loads(response_line)
         except Exception as e:
-            if self.on_connect_result:
-                self.on_connect_result(False, f"Invalid response: {e}")
+            self.on_connect_result(False, f"Invalid response: {e}")
             self.sock.close()
             return
 
         # Check server's answer
         if resp.get("action") == protocol.ACTION_CONNECT and resp.get("status") == "ok":
             # Successfully registered
-            if self.on_connect_result:
-                self.on_connect_result(True, None)
-            # Start background threads: receiver and pinger
+            self.on_connect_result(True, None)
+            # Start background threads: receiver and sender
+            self.sock_selector = selectors.DefaultSelector()
+            self.sock_selector.register(self.sock, selectors.EVENT_READ)
+            self._send_queue = queue.Queue(maxsize=16)
+            self._ping_pending = False
             self.running = True
             self.receiver_thread = threading.Thread(target=self._receive_loop, daemon=True)
             self.receiver_thread.start()
-            self.pinger_thread = threading.Thread(target=self._ping_loop, daemon=True)
-            self.pinger_thread.start()
+            self.sender_thread = threading.Thread(target=self._send_loop, daemon=True)
+            self.sender_thread.start()
         else:
             # Received an error (e.g., username already taken)
             err = resp.get("error", "unknown error")
-            if self.on_connect_result:
-                self.on_connect_result(False, err)
+            self.on_connect_result(False, err)
             self.sock.close()
 
     def send_message(self, to: str, message: str):
@@ -110,8 +151,7 @@ class ChatClient:
         try:
             self._send_json(payload)
         except Exception as e:
-            if self.on_error:
-                self.on_error(f"Send error: {e}")
+            self.on_error(f"Send error: {e}")
 
     def send_file_request(self, to: str, file_path: str):
         """
@@ -130,8 +170,7 @@ class ChatClient:
             payload = protocol.build_file_request("", to, filename, filesize, filetype)
             self._send_json(payload)
         except Exception as e:
-            if self.on_error:
-                self.on_error(f"Send file request error: {e}")
+            self.on_error(f"Send file request error: {e}")
 
     def send_file_accept(self, to: str, filename: str):
         """
@@ -143,8 +182,7 @@ class ChatClient:
         try:
             self._send_json(payload)
         except Exception as e:
-            if self.on_error:
-                self.on_error(f"Send file accept error: {e}")
+            self.on_error(f"Send file accept error: {e}")
 
     def send_file_cancel(self, to: str, filename: str, reason: str = ""):
         """
@@ -156,34 +194,106 @@ class ChatClient:
         try:
             self._send_json(payload)
         except Exception as e:
-            if self.on_error:
-                self.on_error(f"Send file cancel error: {e}")
+            self.on_error(f"Send file cancel error: {e}")
 
-    def send_file_data(self, to: str, filename: str, chunk_index: int, data: bytes, is_last_chunk: bool):
+    def send_file_data(self, to: str, filename: str, chunk_index: int, data: bytes | memoryview,
+                       is_last_chunk: bool):
         """
-        Send file chunk (file_transfer_data) to recipient.
+        Send file chunk (file_transfer_data) to recipient as a binary frame.
+        `data` may be a memoryview over a reused buffer: it is copied out before returning.
         """
         if not self.running:
             return
-        payload = protocol.build_file_data("", to, filename, chunk_index, data, is_last_chunk)
         try:
-            self._send_json(payload)
+            frame_header = protocol.pack_file_data_header("", to, filename, chunk_index, is_last_chunk, len(data))
+            self._send_binary_frame(frame_header, data)
         except Exception as e:
-            if self.on_error:
-                self.on_error(f"Send file data error: {e}")
+            self.on_error(f"Send file data error: {e}")
+
+    def _send_file_slice(self, to: str, filename: str, chunk_index: int, file_obj, offset: int, count: int,
+                        is_last_chunk: bool):
+        """
+        Send `count` bytes of the open binary `file_obj`, starting at `offset`, as file chunk
+        (file_transfer_data) to recipient. The frame header goes through the send buffer,
+        the chunk's bytes are pushed by socket.sendfile() straight from the file.
+        The frame is never left half-sent: if the file ends early, the rest of the frame
+        is padded with zeros and OSError is raised; on any other error the connection
+        is shut down, as the stream can no longer be parsed.
+        """
+        if not self.running:
+            return
+        frame_header = protocol.pack_file_data_header("", to, filename, chunk_index, is_last_chunk, count)
+        # Bypasses the send queue: let the chunks queued before this one go out first
+        self._send_queue.join()
+        with self._send_lock:
+            try:
+                self.sock_wfile.write(frame_header)
+                self.sock_wfile.flush()
+                sent = self.sock.sendfile(file_obj, offset, count)
+                if sent != count:
+                    self.sock.sendall(bytes(count - sent))
+            except BaseException:
+                try:
+                    self.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                raise
+        if sent != count:
+            raise OSError(f"file ended after {offset + sent} bytes")
+
+    def send_file(self, to: str, file_path: str, filename: str, chunk_size: int = 65536):
+        """
+        Send the whole file at `file_path` to recipient in chunks of `chunk_size` bytes
+        (file_transfer_data), then send file_transfer_complete.
+        Where the platform supports it, the kernel copies each chunk straight from the file
+        to the socket; otherwise the chunks are read into one reused buffer.
+        Errors opening or reading the file are raised to the caller; once chunks are being
+        sent, the recipient then gets file_transfer_cancel instead of file_transfer_complete.
+        """
+        if not self.running:
+            return
+        total = os.path.getsize(file_path)
+        with open(file_path, "rb") as f:
+            try:
+                if self.can_sendfile:
+                    for chunk_index, offset in enumerate(range(0, total, chunk_size)):
+                        count = min(chunk_size, total - offset)
+                        is_last = offset + count >= total
+                        self._send_file_slice(to, filename, chunk_index, f, offset, count, is_last)
+                else:
+                    buf = bytearray(chunk_size)
+                    view = memoryview(buf)
+                    chunk_index = 0
+                    offset = 0  # bytes read so far, instead of asking f.tell() for every chunk
+                    while True:
+                        n = f.readinto(buf)
+                        if not n:
+                            break
+                        offset += n
+                        is_last = offset >= total
+                        self.send_file_data(to, filename, chunk_index, view[:n], is_last)
+                        chunk_index += 1
+                    if offset < total:
+                        raise OSError(f"file ended after {offset} bytes")
+            except Exception:
+                # Queued behind the chunks already sent, like file_transfer_complete
+                cancel = protocol.build_file_cancel("", to, filename, "Sender failed to read the file")
+                self._send_queue.put(((_dumps_line(cancel),), True))
+                raise
+        self.send_file_complete(to, filename)
 
     def send_file_complete(self, to: str, filename: str):
         """
         Send message (file_transfer_complete) when the transfer is completed.
+        It is queued behind the file's chunks, and flushes any of them still held in the send buffer.
         """
         if not self.running:
             return
         payload = protocol.build_file_complete("", to, filename)
         try:
-            self._send_json(payload)
+            self._send_queue.put(((_dumps_line(payload),), True))
         except Exception as e:
-            if self.on_error:
-                self.on_error(f"Send file complete error: {e}")
+            self.on_error(f"Send file complete error: {e}")
 
     def disconnect(self):
         """
@@ -208,95 +318,187 @@ class ChatClient:
     def _send_json(self, data: dict):
         """
         Helper method: serialize `data` to JSON + '\n' and send over the socket.
+        Control messages are flushed immediately.
         """
-        text = json.dumps(data, ensure_ascii=False) + "\n"
-        self.sock.sendall(text.encode("utf-8"))
+        line = _dumps_line(data)
+        with self._send_lock:
+            self.sock_wfile.write(line)
+            self.sock_wfile.flush()
 
-    def _receive_loop(self):
+    def _send_binary_frame(self, frame_header: bytes, payload: bytes | memoryview):
         """
-        Background thread that continuously reads lines from self.sock_file,
-        parses JSON, and invokes the appropriate callbacks based on action.
+        Helper method: queue `frame_header` (see protocol.pack_frame_header) and raw `payload`
+        as one binary frame for the sender thread.
+        Blocks only while the queue is full, so the caller can read ahead while earlier frames
+        are being sent. The frame is not flushed: the buffer goes out when it fills up, when
+        the queue runs empty or with the next control message (e.g. file_transfer_complete).
         """
-        while self.running:
+        # Copy the payload: the caller may reuse its buffer as soon as we return
+        self._send_queue.put(((frame_header, bytes(payload)), False))
+
+    def _send_ping(self):
+        """
+        Helper method: have the sender thread write {"action":"ping"} without ever blocking
+        the caller (the receiver thread), even while file chunks fill up the send queue.
+        """
+        try:
+            self._send_queue.put_nowait(((_PING_LINE,), True))
+        except queue.Full:
+            self._ping_pending = True
+
+    def _send_loop(self):
+        """
+        Background thread that writes the queued messages to the socket in order,
+        until it gets the None sentinel. Once a write fails, the remaining items
+        are dropped so producers never block on a queue nobody drains.
+        """
+        failed = False
+        while True:
+            item = self._send_queue.get()
             try:
-                line = self.sock_file.readline()
-                if not line:
-                    # Server closed the connection
+                if item is None:
                     break
-                msg = json.loads(line)
-            except Exception:
-                continue
-
-            action = msg.get("action")
-            if action == protocol.ACTION_MESSAGE:
-                sender = msg.get("from")
-                text = msg.get("message")
-                if self.on_message_received:
-                    self.on_message_received(sender, text)
-            elif action == protocol.ACTION_USER_LIST:
-                users = msg.get("users", [])
-                if self.on_user_list_updated:
-                    self.on_user_list_updated(users)
-            elif action == protocol.ACTION_ERROR:
-                err = msg.get("error", "unknown")
-                if self.on_error:
-                    self.on_error(err)
-            # File transfer events handlers
-            elif action == protocol.ACTION_FILE_REQUEST:
-                sender = msg.get("from")
-                filename = msg.get("filename")
-                filesize = msg.get("filesize")
-                filetype = msg.get("filetype")
-                if self.on_file_request:
-                    self.on_file_request(sender, filename, filesize, filetype)
-            elif action == protocol.ACTION_FILE_ACCEPT:
-                sender = msg.get("from")
-                filename = msg.get("filename")
-                if self.on_file_accept:
-                    self.on_file_accept(sender, filename)
-            elif action == protocol.ACTION_FILE_CANCEL:
-                sender = msg.get("from")
-                filename = msg.get("filename")
-                reason = msg.get("reason", "")
-                if self.on_file_cancel:
-                    self.on_file_cancel(sender, filename, reason)
-            elif action == protocol.ACTION_FILE_DATA:
-                sender = msg.get("from")
-                filename = msg.get("filename")
-                data_b64 = msg.get("data")
-                is_last_chunk = msg.get("is_last_chunk", False)
-                try:
-                    data = base64.b64decode(data_b64)
-                except Exception as e:
-                    if self.on_error:
-                        self.on_error(f"Decode file data error: {e}")
+                if failed:
                     continue
-                if self.on_file_data:
-                    self.on_file_data(sender, filename, data, is_last_chunk)
-            elif action == protocol.ACTION_FILE_COMPLETE:
-                sender = msg.get("from")
-                filename = msg.get("filename")
-                if self.on_file_complete:
-                    self.on_file_complete(sender, filename)
+                parts, flush = item
+                with self._send_lock:
+                    if self.can_sendmsg and sum(len(part) for part in parts) >= _SEND_BUFFER_SIZE:
+                        # Would not fit in the buffer anyway (e.g. a full file chunk): hand header
+                        # and payload to the kernel in one sendmsg() instead of copying them
+                        self.sock_wfile.flush()
+                        self._sendmsg_all(parts)
+                    else:
+                        for part in parts:
+                            self.sock_wfile.write(part)
+                    if self._ping_pending:
+                        self._ping_pending = False
+                        self.sock_wfile.write(_PING_LINE)
+                        flush = True
+                    if flush or self._send_queue.empty():
+                        self.sock_wfile.flush()
+            except Exception as e:
+                failed = True
+                if self.running:
+                    self.on_error(f"Send error: {e}")
+            finally:
+                self._send_queue.task_done()
 
-        # Exiting loop means the connection is gone
-        self.running = False
-        if self.on_disconnected:
-            self.on_disconnected()
+    def _sendmsg_all(self, parts):
+        """
+        Helper method: scatter-gather counterpart of sock.sendall(b"".join(parts)),
+        without joining the parts into a new buffer first.
+        """
+        views = [memoryview(part) for part in parts]
+        while views:
+            sent = self.sock.sendmsg(views)
+            while views and sent >= len(views[0]):
+                sent -= len(views.pop(0))
+            if views:
+                views[0] = views[0][sent:]
+
+    def _read_message(self, timeout: float | None = None):
+        """
+        Helper method: return the next (message, payload) received from the server,
+        where payload is the raw bytes of a binary frame (None for a JSON line).
+        Returns (None, None) once the server closed the connection.
+        Raises TimeoutError if no data arrives within `timeout` seconds.
+        Messages are parsed in place: the buffer is compacted only once all complete
+        messages from the last recv_into() have been consumed.
+        """
+        while True:
+            parsed = protocol.split_message(self._recv_buf, self._recv_pos, self._recv_end)
+            if parsed:
+                json_start, json_end, payload_end = parsed
+                view = self._recv_view
+                if payload_end is None:
+                    self._recv_pos = json_end
+                    return _loads(view[json_start:json_end]), None
+                self._recv_pos = payload_end
+                # Copy the payload out: callbacks may keep it after the buffer is reused
+                return _loads(view[json_start:json_end]), bytes(view[json_end:payload_end])
+
+            # Only a partial message is left: move it to the front of the buffer in one go
+            pending = self._recv_end - self._recv_pos
+            if pending == len(self._recv_buf):
+                # A frame larger than the whole buffer: grow it
+                self._recv_buf = bytearray(2 * len(self._recv_buf))
+                self._recv_buf[:pending] = self._recv_view
+                self._recv_view = memoryview(self._recv_buf)
+            elif self._recv_pos:
+                self._recv_view[:pending] = self._recv_view[self._recv_pos:self._recv_end]
+            self._recv_pos, self._recv_end = 0, pending
+
+            if timeout is not None and not self.sock_selector.select(timeout):
+                raise TimeoutError
+            # Large reads: one recv_into() serves many lines/chunks
+            n = self.sock.recv_into(self._recv_view[self._recv_end:])
+            if not n:
+                return None, None
+            self._recv_end += n
 
-    def _ping_loop(self):
+    def _receive_loop(self):
         """
-        Background thread that sleeps for ping_interval seconds,
-        then sends {"action":"ping"} to let the server know we're still alive.
+        Background thread that continuously reads JSON lines and binary frames,
+        and invokes the appropriate callbacks based on action.
+        Every ping_interval seconds it also sends {"action":"ping"}
+        to let the server know we're still alive.
         """
+        next_ping = time.monotonic() + self.ping_interval
         while self.running:
-            time.sleep(self.ping_interval)
+            now = time.monotonic()
+            if now >= next_ping:
+                self._send_ping()
+                next_ping = now + self.ping_interval
+
             try:
-                self._send_json(protocol.build_ping())
-            except:
-                break  # Failed to send a ping–exit loop
+                msg, payload = self._read_message(timeout=next_ping - now)
+                if msg is None:
+                    # Server closed the connection
+                    break
+            except TimeoutError:
+                continue  # Time to ping
+            except ValueError:
+                continue  # Skip any malformed JSON
+            except OSError:
+                break
 
-        # If ping loop ends, mark as disconnected
+            handler = self._dispatch.get(msg.get("action"))
+            if handler:
+                handler(msg, payload)
+
+        # Exiting loop means the connection is gone
         self.running = False
-        if self.on_disconnected:
-            self.on_disconnected()
+        self.sock_selector.close()
+        self._send_queue.put(None)
+        self.on_disconnected()
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Incoming message handlers, looked up by action in self._dispatch.
+    # Each takes the decoded message and the binary frame payload (or None).
+    # ──────────────────────────────────────────────────────────────────────
+    def _handle_message(self, msg: dict, payload):
+        self.on_message_received(msg.get("from"), msg.get("message"))
+
+    def _handle_user_list(self, msg: dict, payload):
+        self.on_user_list_updated(msg.get("users", []))
+
+    def _handle_error(self, msg: dict, payload):
+        self.on_error(msg.get("error", "unknown"))
+
+    def _handle_file_request(self, msg: dict, payload):
+        self.on_file_request(msg.get("from"), msg.get("filename"), msg.get("filesize"), msg.get("filetype"))
+
+    def _handle_file_accept(self, msg: dict, payload):
+        self.on_file_accept(msg.get("from"), msg.get("filename"))
+
+    def _handle_file_cancel(self, msg: dict, payload):
+        self.on_file_cancel(msg.get("from"), msg.get("filename"), msg.get("reason", ""))
+
+    def _handle_file_data(self, msg: dict, payload):
+        if payload is None:
+            self.on_error(f"File data for '{msg.get('filename')}' was not sent as a binary frame")
+            return
+        self.on_file_data(msg.get("from"), msg.get("filename"), payload, msg.get("is_last_chunk", False))
+
+    def _handle_file_complete(self, msg: dict, payload):
+        self.on_file_complete(msg.get("from"), msg.get("filename"))
@@ -1,18 +1,31 @@
 import tkinter as tk
-from tkinter import messagebox, scrolledtext
+from tkinter import messagebox
+from tkinter import font as tkfont
 from tkinter import filedialog
 import os
 import threading
+import queue
+import difflib
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from .chat_logic import ChatClient  # Import the networking logic
 
+# Rows of chat history kept for the chat view; older ones are dropped
+CHAT_HISTORY_LINES = 5000
+# Size of the chat view, in characters of its monospace font: longer lines wrap onto several rows
+CHAT_WRAP_COLUMNS = 50
+CHAT_VISIBLE_ROWS = 15
+# How often (ms) the GUI thread runs the updates queued by the network and file threads
+UI_POLL_MS = 30
+
 
 class ChatUI:
     """
     ChatUI handles all Tkinter-based GUI:
-      - creating widgets (frames, buttons, text areas, listboxes)
+      - creating widgets (frames, buttons, the chat view, listboxes)
       - wiring button callbacks to ChatClient methods (connect, send_message, disconnect)
       - registering ChatClient callbacks (on_connect_result, on_message_received, etc.)
-      - using root.after(...) to ensure thread-safe UI updates
+      - queueing UI updates from other threads for the GUI thread (see _post_ui)
     """
 
     def __init__(self, root: tk.Tk, server_host: str, server_port: int):
@@ -21,8 +34,17 @@ class ChatUI:
 
         # Initialize instance variables
         self.username = None
-        self._receiving_files = {}  # (sender, filename) -> save_path
+        self._receiving_files = {}  # (sender, filename) -> {"path": save_path, "fh": open file handle}
+        self._receiving_files_lock = threading.Lock()  # shared by the GUI and network threads
         self._pending_file_send = None  # (to_user, file_path, filename)
+        self._displayed_users = []  # current rows of users_listbox
+        self._pending_lines = deque()  # chat lines waiting for the next _flush_chat
+        self._chat_rows = deque(maxlen=CHAT_HISTORY_LINES)  # chat history, wrapped to CHAT_WRAP_COLUMNS
+        self._chat_first_row = 0  # index in _chat_rows of the top row of the chat view
+        self._flush_scheduled = False
+        self._ui_queue = queue.SimpleQueue()  # (fn, args) to run on the GUI thread, see _post_ui
+        # Worker threads sending accepted files, reused across transfers
+        self._io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="file-io")
 
         # Set up the ChatClient and register callbacks
         self._setup_networking(server_host, server_port)
@@ -37,6 +59,29 @@ class ChatUI:
         # Configure window close behavior
         self.root.protocol("WM_DELETE_WINDOW", self._on_closing)
 
+        self._drain_after_id = self.root.after(UI_POLL_MS, self._drain_ui_queue)
+
+    def _post_ui(self, fn, *args):
+        """
+        Schedule fn(*args) on the GUI thread. Safe to call from any thread:
+        the call is queued and run by the next _drain_ui_queue.
+        """
+        self._ui_queue.put((fn, args))
+
+    def _drain_ui_queue(self):
+        """
+        Runs every UI_POLL_MS on the GUI thread: executes all queued UI updates at once,
+        so a burst of network events costs one Tk wakeup instead of one per event.
+        """
+        # Reschedule first: an update that raises must not stop the polling
+        self._drain_after_id = self.root.after(UI_POLL_MS, self._drain_ui_queue)
+        while True:
+            try:
+                fn, args = self._ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            fn(*args)
+
     def _setup_networking(self, server_host: str, server_port: int):
         """
         Create the ChatClient instance, set ping interval, and register all callbacks.
@@ -86,13 +131,31 @@ class ChatUI:
         self.users_listbox = tk.Listbox(self.chat_frame, width=20, height=15)
         self.users_listbox.grid(row=1, column=0, padx=5, pady=5, sticky="n")
 
-        # Chat history text area
+        # Chat history view: a canvas with one text item per visible row. Scrolling only
+        # changes which rows of _chat_rows they show, so the cost of drawing does not grow
+        # with the length of the history (see _render_chat).
         self.chat_label = tk.Label(self.chat_frame, text="Chat:")
         self.chat_label.grid(row=0, column=1, padx=5, pady=5, sticky="nw")
-        self.chat_text = scrolledtext.ScrolledText(
-            self.chat_frame, width=50, height=15, state="disabled"
+        chat_box = tk.Frame(self.chat_frame)
+        chat_box.grid(row=1, column=1, padx=5, pady=5, sticky="n")
+        chat_font = tkfont.nametofont("TkFixedFont")
+        row_height = chat_font.metrics("linespace")
+        self.chat_canvas = tk.Canvas(
+            chat_box, background="white", highlightthickness=0,
+            width=chat_font.measure("0") * CHAT_WRAP_COLUMNS + 4, height=row_height * CHAT_VISIBLE_ROWS + 4
         )
-        self.chat_text.grid(row=1, column=1, padx=5, pady=5, sticky="n")
+        self.chat_scrollbar = tk.Scrollbar(chat_box, command=self._scroll_chat)
+        self.chat_canvas.pack(side="left")
+        self.chat_scrollbar.pack(side="right", fill="y")
+        self._chat_row_items = [
+            self.chat_canvas.create_text(2, 2 + i * row_height, anchor="nw", font=chat_font, text="")
+            for i in range(CHAT_VISIBLE_ROWS)
+        ]
+        self.chat_scrollbar.set(0.0, 1.0)
+        # Mouse wheel: <MouseWheel> on Windows and macOS, buttons 4/5 on X11
+        self.chat_canvas.bind("<MouseWheel>", lambda e: self._scroll_chat("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.chat_canvas.bind("<Button-4>", lambda e: self._scroll_chat("scroll", -1, "units"))
+        self.chat_canvas.bind("<Button-5>", lambda e: self._scroll_chat("scroll", 1, "units"))
 
     def _create_send_ui(self):
         """
@@ -137,23 +200,25 @@ class ChatUI:
     def _on_connect_result(self, success: bool, error: str | None):
         """
         Callback from ChatClient indicating whether connect succeeded.
-        Runs in a background thread, so wrap UI updates in root.after().
+        Runs in a background thread, so UI updates go through _post_ui().
         """
+        self._post_ui(self._do_connect_result, success, error)
 
-        def handle():
-            if success:
-                # Save the username, show chat UI, and enable Send button
-                self.username = self.username_entry.get().strip()
-                self._show_chat_ui()
-                self._append_chat(f"*** Connected as {self.username} ***\n")
-                self.send_btn.config(state="normal")
-                self.send_file_btn.config(state="normal")
-            else:
-                # Show error and re-enable Connect button
-                messagebox.showerror("Error", f"Connection refused: {error}")
-                self.connect_btn.config(state="normal")
-
-        self.root.after(0, handle)
+    def _do_connect_result(self, success: bool, error: str | None):
+        """
+        GUI-thread part of _on_connect_result.
+        """
+        if success:
+            # Save the username, show chat UI, and enable Send button
+            self.username = self.username_entry.get().strip()
+            self._show_chat_ui()
+            self._append_chat(f"*** Connected as {self.username} ***\n")
+            self.send_btn.config(state="normal")
+            self.send_file_btn.config(state="normal")
+        else:
+            # Show error and re-enable Connect button
+            messagebox.showerror("Error", f"Connection refused: {error}")
+            self.connect_btn.config(state="normal")
 
     def _show_chat_ui(self):
         """
@@ -166,50 +231,74 @@ class ChatUI:
     def _on_message_received(self, sender: str, text: str):
         """
         Callback: a private message arrived from `sender`.
-        Wrap in root.after to ensure we update widgets on the GUI thread.
+        Queued with _post_ui to update widgets on the GUI thread.
         """
-
-        def handle():
-            self._append_chat(f"{sender}: {text}\n")
-
-        self.root.after(0, handle)
+        self._post_ui(self._append_chat, f"{sender}: {text}\n")
 
     def _on_user_list_updated(self, users: list[str]):
         """
         Callback: the list of active users updated.
-        Wrap in root.after to update the Listbox on the GUI thread.
+        Queued with _post_ui to update the Listbox on the GUI thread.
+        Only the rows that changed are deleted/inserted, so a single join or leave
+        costs one or two Tcl calls and the rest of the list is not redrawn.
         """
+        self._post_ui(self._do_user_list_updated, users)
 
-        def handle():
-            self.users_listbox.delete(0, tk.END)
-            for u in users:
-                if u != self.username:
-                    self.users_listbox.insert(tk.END, u)
-
-        self.root.after(0, handle)
+    def _do_user_list_updated(self, users: list[str]):
+        """
+        GUI-thread part of _on_user_list_updated.
+        """
+        new_users = [u for u in users if u != self.username]
+        if new_users == self._displayed_users:
+            return
+        matcher = difflib.SequenceMatcher(a=self._displayed_users, b=new_users, autojunk=False)
+        # Apply edits from the bottom up so earlier row indexes stay valid
+        for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+            if tag == "equal":
+                continue
+            if i2 > i1:
+                self.users_listbox.delete(i1, i2 - 1)
+            if j2 > j1:
+                self.users_listbox.insert(i1, *new_users[j1:j2])
+        self._displayed_users = new_users
 
     def _on_error(self, error_text: str):
         """
         Callback: the server returned an error action.
-        Display it in the chat area (wrapped in root.after for thread safety).
+        Display it in the chat area (queued with _post_ui for thread safety).
         """
-
-        def handle():
-            self._append_chat(f"[Error] {error_text}\n")
-
-        self.root.after(0, handle)
+        self._post_ui(self._append_chat, f"[Error] {error_text}\n")
 
     def _on_disconnected(self):
         """
         Callback: the connection to the server was lost (or client disconnected).
+        No more chunks will come, so files still being received are closed here.
         """
+        for sender, filename in self._close_receiving_files():
+            self._post_ui(self._append_chat, f"[Error] File transfer '{filename}' from {sender} is interrupted.\n")
+        self._post_ui(self._do_disconnected)
 
-        def handle():
-            self._append_chat("*** Disconnected from server ***\n")
-            self.send_btn.config(state="disabled")
-            self.send_file_btn.config(state="disabled")
+    def _close_receiving_files(self):
+        """
+        Close and forget the files of all unfinished incoming transfers.
+        Returns their (sender, filename) keys.
+        """
+        with self._receiving_files_lock:
+            receiving, self._receiving_files = self._receiving_files, {}
+        for entry in receiving.values():
+            try:
+                entry["fh"].close()
+            except OSError:
+                pass
+        return list(receiving)
 
-        self.root.after(0, handle)
+    def _do_disconnected(self):
+        """
+        GUI-thread part of _on_disconnected.
+        """
+        self._append_chat("*** Disconnected from server ***\n")
+        self.send_btn.config(state="disabled")
+        self.send_file_btn.config(state="disabled")
 
     def _send_message(self):
         """
@@ -250,101 +339,179 @@ class ChatUI:
         Shows a dialog asking about accepting the file.
         If you agree, opens a dialog to select a folder and saves the path for further chunks.
         """
+        self._post_ui(self._do_file_request, sender, filename, filesize, filetype)
 
-        def handle():
-            msg = f"User {sender} offers to accept the file '{filename}' ({filesize} bytes, typ {filetype}). Accept?"
-            if messagebox.askyesno("Accept file?", msg):
-                save_dir = filedialog.askdirectory(title="Select a folder to save the file")
-                if not save_dir:
-                    self.chat_client.send_file_cancel(sender, filename, "User canceled the file selection")
-                    self._append_chat(f"[Failure] {sender} -> {self.username}: refusal to accept file '{filename}' ("
-                                      f"folder is not selected).\n")
-                    return
-                save_path = os.path.join(save_dir, filename)
-                self._receiving_files[(sender, filename)] = save_path
-                self.chat_client.send_file_accept(sender, filename)
-                self._append_chat(f"[Success] {sender} -> {self.username}: file accepted '{filename}'.\n")
-            else:
-                self.chat_client.send_file_cancel(sender, filename, "User refused.")
-                self._append_chat(f"[Failure] {sender} -> {self.username}: refusal to accept file '{filename}'.\n")
-
-        self.root.after(0, handle)
+    def _do_file_request(self, sender: str, filename: str, filesize: int, filetype: str):
+        """
+        GUI-thread part of _on_file_request.
+        """
+        msg = f"User {sender} offers to accept the file '{filename}' ({filesize} bytes, typ {filetype}). Accept?"
+        if messagebox.askyesno("Accept file?", msg):
+            save_dir = filedialog.askdirectory(title="Select a folder to save the file")
+            if not save_dir:
+                self.chat_client.send_file_cancel(sender, filename, "User canceled the file selection")
+                self._append_chat(f"[Failure] {sender} -> {self.username}: refusal to accept file '{filename}' ("
+                                  f"folder is not selected).\n")
+                return
+            save_path = os.path.join(save_dir, filename)
+            try:
+                fh = open(save_path, "wb", buffering=1024 * 1024)
+            except (OSError, ValueError) as e:  # ValueError: the sender's filename contains a NUL
+                self.chat_client.send_file_cancel(sender, filename, "Receiver cannot save the file")
+                self._append_chat(f"[Failure] {sender} -> {self.username}: refusal to accept file '{filename}' "
+                                  f"({e}).\n")
+                return
+            with self._receiving_files_lock:
+                self._receiving_files[(sender, filename)] = {"path": save_path, "fh": fh}
+            self.chat_client.send_file_accept(sender, filename)
+            self._append_chat(f"[Success] {sender} -> {self.username}: file accepted '{filename}'.\n")
+        else:
+            self.chat_client.send_file_cancel(sender, filename, "User refused.")
+            self._append_chat(f"[Failure] {sender} -> {self.username}: refusal to accept file '{filename}'.\n")
 
     def _on_file_accept(self, sender: str, filename: str):
         """
         Callback: sender accepted the file transfer request.
         If this is our file, we start sending chunks.
         """
+        self._post_ui(self._do_file_accept, sender, filename)
 
-        def handle():
-            self._append_chat(f"{sender} accepted file '{filename}'.\n")
-            if self._pending_file_send and self._pending_file_send[0] == sender \
-                    and self._pending_file_send[2] == filename:
-                to_user, file_path, _ = self._pending_file_send
-                threading.Thread(
-                    target=self._send_file_chunks,
-                    args=(to_user, file_path, filename),
-                    daemon=True
-                ).start()
-                self._pending_file_send = None
-
-        self.root.after(0, handle)
+    def _do_file_accept(self, sender: str, filename: str):
+        """
+        GUI-thread part of _on_file_accept.
+        """
+        self._append_chat(f"{sender} accepted file '{filename}'.\n")
+        if self._pending_file_send and self._pending_file_send[0] == sender \
+                and self._pending_file_send[2] == filename:
+            to_user, file_path, _ = self._pending_file_send
+            self._io_pool.submit(self._send_file_chunks, to_user, file_path, filename)
+            self._pending_file_send = None
 
     def _on_file_cancel(self, sender: str, filename: str, reason: str):
         """
         Callback: sender or recipient canceled file transfer.
         A cancellation message (with a reason, if specified) is recorded in the chat.
         """
+        self._post_ui(self._do_file_cancel, sender, filename, reason)
 
-        def handle():
-            if reason:
-                self._append_chat(f"[Refusal] {sender} canceled file transfer '{filename}': {reason}.\n")
-            else:
-                self._append_chat(f"[Refusal] {sender} canceled file transfer '{filename}'.\n")
-
-        self.root.after(0, handle)
+    def _do_file_cancel(self, sender: str, filename: str, reason: str):
+        """
+        GUI-thread part of _on_file_cancel.
+        """
+        if reason:
+            self._append_chat(f"[Refusal] {sender} canceled file transfer '{filename}': {reason}.\n")
+        else:
+            self._append_chat(f"[Refusal] {sender} canceled file transfer '{filename}'.\n")
 
     def _on_file_data(self, sender: str, filename: str, data: bytes, is_last_chunk: bool):
         """
         Callback: received a file chunk from the sender.
-        Saves the chunk to a file at the path selected when accepting the file.
-        """
-
-        def handle():
-            key = (sender, filename)
-            save_path = self._receiving_files.get(key)
-            if not save_path:
-                # If the path is not found, ignore the chunk or display an error
-                self._append_chat(f"[Error] Unknown file '{filename}' from {sender}, chunk is ignored.\n")
-                return
-            with open(save_path, "ab") as f:
-                f.write(data)
-            if is_last_chunk:
-                # self._append_chat(f"[Success] {sender} -> {self.username}: file transfer '{filename}' completed.\n")
+        Writes the chunk to the file opened when accepting it, and closes the file after the last chunk.
+        Unlike the other callbacks, the write happens right here on the network thread: only widget
+        updates need the GUI thread, and disk I/O there would freeze the UI during a download.
+        """
+        key = (sender, filename)
+        with self._receiving_files_lock:
+            entry = self._receiving_files.get(key)
+            if entry and is_last_chunk:
                 del self._receiving_files[key]
 
-        self.root.after(0, handle)
+        if not entry:
+            # If the file is not found, ignore the chunk and display an error
+            self._post_ui(self._append_chat, f"[Error] Unknown file '{filename}' from {sender}, chunk is ignored.\n")
+            return
+
+        try:
+            entry["fh"].write(data)
+            if is_last_chunk:
+                entry["fh"].close()
+        except (OSError, ValueError) as e:  # ValueError: closed meanwhile by _close_receiving_files
+            with self._receiving_files_lock:
+                self._receiving_files.pop(key, None)
+            try:
+                entry["fh"].close()
+            except OSError:
+                pass  # Flushing the rest of the buffer failed the same way: already reported below
+            self._post_ui(self._append_chat, f"[Error] Failed to save file '{filename}' from {sender}: {e}\n")
 
     def _on_file_complete(self, sender: str, filename: str):
         """
         Callback: file transfer is completed.
         A success message is recorded in the chat.
         """
+        self._post_ui(self._do_file_complete, sender, filename)
 
-        def handle():
-            self._append_chat(f"[Success] {sender} -> {self.username}: file transfer '{filename}' is completed.\n")
-
-        self.root.after(0, handle)
+    def _do_file_complete(self, sender: str, filename: str):
+        """
+        GUI-thread part of _on_file_complete.
+        """
+        # Empty files have no last chunk: close the file here
+        with self._receiving_files_lock:
+            entry = self._receiving_files.pop((sender, filename), None)
+        if entry:
+            entry["fh"].close()
+        self._append_chat(f"[Success] {sender} -> {self.username}: file transfer '{filename}' is completed.\n")
 
     def _append_chat(self, text: str):
         """
-        Inserts a line of text into the chat Text widget.
-        Always called from the GUI thread (via root.after).
+        Queues a line of text for the chat view.
+        Lines queued until Tk is idle are inserted together by _flush_chat,
+        so a burst of messages costs one redraw instead of one per line.
+        """
+        self._pending_lines.append(text)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.root.after_idle(self._flush_chat)
+
+    def _flush_chat(self):
+        """
+        Adds all queued lines to the chat history, wrapped to CHAT_WRAP_COLUMNS, and scrolls
+        the chat view to the end with a single redraw. The history keeps the last
+        CHAT_HISTORY_LINES rows to bound memory.
+        Always called from the GUI thread (via root.after_idle).
         """
-        self.chat_text.config(state="normal")
-        self.chat_text.insert(tk.END, text)
-        self.chat_text.see(tk.END)
-        self.chat_text.config(state="disabled")
+        self._flush_scheduled = False
+        if not self._pending_lines:
+            return
+        rows = self._chat_rows
+        while self._pending_lines:
+            # Queued texts go straight into rows, without joining them into one string first
+            for line in self._pending_lines.popleft().splitlines():
+                if len(line) <= CHAT_WRAP_COLUMNS:
+                    rows.append(line)
+                else:
+                    rows.extend(line[start:start + CHAT_WRAP_COLUMNS]
+                                for start in range(0, len(line), CHAT_WRAP_COLUMNS))
+        self._chat_first_row = max(0, len(self._chat_rows) - CHAT_VISIBLE_ROWS)
+        self._render_chat()
+
+    def _scroll_chat(self, *args):
+        """
+        Scrollbar command (and mouse wheel handler) of the chat view: takes the same
+        arguments as a widget's yview(), i.e. ("moveto", fraction) or ("scroll", n, "units"|"pages").
+        """
+        if args[0] == "moveto":
+            first = int(float(args[1]) * len(self._chat_rows))
+        else:
+            step = int(args[1]) * (CHAT_VISIBLE_ROWS if args[2] == "pages" else 1)
+            first = self._chat_first_row + step
+        first = max(0, min(first, len(self._chat_rows) - CHAT_VISIBLE_ROWS))
+        if first != self._chat_first_row:
+            self._chat_first_row = first
+            self._render_chat()
+
+    def _render_chat(self):
+        """
+        Shows rows _chat_first_row.. of the chat history in the chat view's CHAT_VISIBLE_ROWS
+        text items and updates the scrollbar.
+        """
+        rows = self._chat_rows
+        first = self._chat_first_row
+        for i, item in enumerate(self._chat_row_items):
+            row = first + i
+            self.chat_canvas.itemconfigure(item, text=rows[row] if row < len(rows) else "")
+        total = max(len(rows), CHAT_VISIBLE_ROWS)
+        self.chat_scrollbar.set(first / total, (first + CHAT_VISIBLE_ROWS) / total)
 
     def _on_closing(self):
         """
@@ -353,26 +520,20 @@ class ChatUI:
         """
         if self.chat_client.running:
             self.chat_client.disconnect()
+        self.root.after_cancel(self._drain_after_id)
+        # Transfers still sending fail as soon as the socket is closed, queued ones are dropped
+        self._io_pool.shutdown(wait=False, cancel_futures=True)
+        self._close_receiving_files()
         self.root.destroy()
 
-    def _send_file_chunks(self, to_user, file_path, filename, chunk_size=4096):
+    def _send_file_chunks(self, to_user, file_path, filename, chunk_size=262144):
         """
-        Reads the file in chunks and sends the chunks via chat_client.send_file_data,
-        then sends file_complete.
+        Sends the file in chunks, then sends file_complete (see ChatClient.send_file).
         """
         try:
-            with open(file_path, "rb") as f:
-                chunk_index = 0
-                while True:
-                    data = f.read(chunk_size)
-                    if not data:
-                        break
-                    is_last = f.tell() == os.path.getsize(file_path)
-                    self.chat_client.send_file_data(to_user, filename, chunk_index, data, is_last)
-                    chunk_index += 1
-            self.chat_client.send_file_complete(to_user, filename)
+            self.chat_client.send_file(to_user, file_path, filename, chunk_size)
         except Exception as e:
-            self._append_chat(f"[Error] Failed to send file '{filename}': {e}\n")
+            self._post_ui(self._append_chat, f"[Error] Failed to send file '{filename}': {e}\n")
 
 
 if __name__ == "__main__":
@@ -4,32 +4,41 @@ protocol.py
 Defines all JSON‐over‐TCP “action” names and their required fields.
 """
 
-import base64
-from typing import Dict, Any
+import json
+import struct
+from functools import lru_cache
+from typing import Dict, Any, Final, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional speed-up, fall back to the standard json module
+    orjson = None
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Standard chat actions
 # ──────────────────────────────────────────────────────────────────────────────
+# Action names are identifier-like literals, which Python already interns: every module
+# sharing them uses the same string objects.
 
 # Client → Server
-ACTION_CONNECT = "connect"
-ACTION_PING = "ping"
-ACTION_MESSAGE = "message"
-ACTION_DISCONNECT = "disconnect"
+ACTION_CONNECT: Final = "connect"
+ACTION_PING: Final = "ping"
+ACTION_MESSAGE: Final = "message"
+ACTION_DISCONNECT: Final = "disconnect"
 
 # Server → Client
-ACTION_USER_LIST = "user_list"
-ACTION_ERROR = "error"
+ACTION_USER_LIST: Final = "user_list"
+ACTION_ERROR: Final = "error"
 
 # ──────────────────────────────────────────────────────────────────────────────
 # File-transfer actions
 # ──────────────────────────────────────────────────────────────────────────────
 
-ACTION_FILE_REQUEST = "file_transfer_request"
-ACTION_FILE_ACCEPT = "file_transfer_accept"
-ACTION_FILE_CANCEL = "file_transfer_cancel"
-ACTION_FILE_DATA = "file_transfer_data"
-ACTION_FILE_COMPLETE = "file_transfer_complete"
+ACTION_FILE_REQUEST: Final = "file_transfer_request"
+ACTION_FILE_ACCEPT: Final = "file_transfer_accept"
+ACTION_FILE_CANCEL: Final = "file_transfer_cancel"
+ACTION_FILE_DATA: Final = "file_transfer_data"
+ACTION_FILE_COMPLETE: Final = "file_transfer_complete"
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Payload schemas
@@ -124,14 +133,15 @@ FILE_CANCEL_SCHEMA = {
 }
 
 # file_transfer_data (Sender → Server, then Server → Receiver)
-# Represents a single chunk of the file’s bytes, base64-encoded.
+# Represents a single chunk of the file’s bytes. Unlike the other actions it is
+# not sent as a JSON line but as a binary frame (see "Binary frames" below):
+# this schema is the frame's JSON header, the chunk's raw bytes follow it.
 # Required fields:
 #   - "action":         ACTION_FILE_DATA
 #   - "from":           sender username
 #   - "to":             recipient username
 #   - "filename":       filename in question
 #   - "chunk_index":    integer index (0, 1, 2, …)
-#   - "data":           base64-encoded string of this chunk’s bytes
 #   - "is_last_chunk":  boolean (True if this is the final chunk)
 FILE_DATA_SCHEMA = {
     "action": ACTION_FILE_DATA,
@@ -139,7 +149,6 @@ FILE_DATA_SCHEMA = {
     "to": "<string>",
     "filename": "<string>",
     "chunk_index": "<int>",
-    "data": "<base64-string>",
     "is_last_chunk": "<bool>"
 }
 
@@ -157,9 +166,65 @@ FILE_COMPLETE_SCHEMA = {
 }
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+# Binary frames
+# ──────────────────────────────────────────────────────────────────────────────
+# Control messages are JSON lines, which always start with "{". File chunks are
+# sent as binary frames instead, so their bytes travel without base64/JSON
+# escaping:
+#   FRAME_MARKER (1 byte) | header length (4 bytes) | payload length (4 bytes)
+#   | header (UTF-8 JSON) | payload (raw bytes)
+# Lengths are big-endian unsigned integers.
+# Frames are a break of the wire format: older servers and clients only read JSON
+# lines (with base64 file data), so clients and server must be upgraded together.
+FRAME_MARKER: Final = 0x01
+FRAME_PREFIX: Final = struct.Struct("!BII")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# JSON codec
+# ──────────────────────────────────────────────────────────────────────────────
+# dumps() returns UTF-8 bytes, dumps_line() the same followed by "\n", ready to send
+# as a JSON line. loads() takes any bytes-like object (including memoryview slices of
+# a receive buffer). orjson is used when it is installed.
+if orjson:
+    dumps = orjson.dumps
+    loads = orjson.loads
+
+    def dumps_line(data: Any) -> bytes:
+        # orjson writes the newline into the same buffer: no second copy to append it
+        return orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE)
+else:
+    def dumps(data: Any) -> bytes:
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def dumps_line(data: Any) -> bytes:
+        return (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+
+    def loads(data) -> Any:
+        # json.loads() does not take memoryview objects
+        return json.loads(bytes(data))
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Helper functions to build or validate messages
 # ──────────────────────────────────────────────────────────────────────────────
+# Templates of the messages built most often: dict.copy() clones them in one step,
+# the build_* helpers below then only fill in the per-message fields.
+_PING_TEMPLATE = {'action': ACTION_PING}
+_DISCONNECT_TEMPLATE = {'action': ACTION_DISCONNECT}
+_CONNECT_RESPONSE_OK_TEMPLATE = {'action': ACTION_CONNECT, 'status': 'ok'}
+_MESSAGE_TEMPLATE: Dict[str, Any] = {'action': ACTION_MESSAGE, 'to': None, 'message': None}
+_FILE_DATA_TEMPLATE: Dict[str, Any] = {
+    'action': ACTION_FILE_DATA,
+    'from': None,
+    'to': None,
+    'filename': None,
+    'chunk_index': None,
+    'is_last_chunk': None,
+}
+
+
 def build_connect(username: str) -> Dict[str, Any]:
     return {
         'action': ACTION_CONNECT,
@@ -168,30 +233,22 @@ def build_connect(username: str) -> Dict[str, Any]:
 
 
 def build_ping() -> Dict[str, Any]:
-    return {
-        'action': ACTION_PING,
-    }
+    return _PING_TEMPLATE.copy()
 
 
 def build_message(to: str, message: str) -> Dict[str, Any]:
-    return {
-        'action': ACTION_MESSAGE,
-        'to': to,
-        'message': message,
-    }
+    msg = _MESSAGE_TEMPLATE.copy()
+    msg['to'] = to
+    msg['message'] = message
+    return msg
 
 
 def build_disconnect() -> Dict[str, Any]:
-    return {
-        'action': ACTION_DISCONNECT,
-    }
+    return _DISCONNECT_TEMPLATE.copy()
 
 
 def build_connect_response_ok() -> Dict[str, Any]:
-    return {
-        'action': ACTION_CONNECT,
-        'status': 'ok',
-    }
+    return _CONNECT_RESPONSE_OK_TEMPLATE.copy()
 
 
 def build_connect_response_err(error: str) -> Dict[str, Any]:
@@ -248,19 +305,15 @@ def build_file_cancel(frm: str, to: str, filename: str, reason: str = "") -> Dic
     return msg
 
 
-def build_file_data(frm: str, to: str, filename: str, chunk_index: int, data: bytes, is_last_chunk: bool) -> \
-        Dict[str, Any]:
-    # data is raw bytes; encode to base64 for JSON transport
-    encoded = base64.b64encode(data).decode('ascii')
-    return {
-        'action': ACTION_FILE_DATA,
-        'from': frm,
-        'to': to,
-        'filename': filename,
-        'chunk_index': chunk_index,
-        'data': encoded,
-        'is_last_chunk': is_last_chunk,
-    }
+def build_file_data(frm: str, to: str, filename: str, chunk_index: int, is_last_chunk: bool) -> Dict[str, Any]:
+    # Header only: the chunk's bytes are the payload of the binary frame
+    msg = _FILE_DATA_TEMPLATE.copy()
+    msg['from'] = frm
+    msg['to'] = to
+    msg['filename'] = filename
+    msg['chunk_index'] = chunk_index
+    msg['is_last_chunk'] = is_last_chunk
+    return msg
 
 
 def build_file_complete(frm: str, to: str, filename: str) -> Dict[str, Any]:
@@ -270,3 +323,63 @@ def build_file_complete(frm: str, to: str, filename: str) -> Dict[str, Any]:
         'to': to,
         'filename': filename,
     }
+
+
+def pack_frame_header(header: Dict[str, Any], payload_len: int) -> bytes:
+    """
+    Serialize everything of a binary frame that precedes its `payload_len` bytes of payload.
+    """
+    header_json = dumps(header)
+    return FRAME_PREFIX.pack(FRAME_MARKER, len(header_json), payload_len) + header_json
+
+
+@lru_cache(maxsize=16)
+def _file_data_header_prefix(frm: str, to: str, filename: str) -> bytes:
+    # JSON of a file_transfer_data header up to its per-chunk fields, which come last:
+    # the fixed fields as an object, left open for the rest
+    fixed = build_file_data(frm, to, filename, 0, False)
+    del fixed['chunk_index'], fixed['is_last_chunk']
+    return dumps(fixed)[:-1] + b','
+
+
+def pack_file_data_header(frm: str, to: str, filename: str, chunk_index: int, is_last_chunk: bool,
+                          payload_len: int) -> bytes:
+    """
+    Same as pack_frame_header(build_file_data(...), payload_len), but only the per-chunk
+    fields are serialized for every chunk: the rest of the header is cached per transfer.
+    """
+    header_json = b'%s"chunk_index":%d,"is_last_chunk":%s}' % (
+        _file_data_header_prefix(frm, to, filename), chunk_index, b'true' if is_last_chunk else b'false')
+    return FRAME_PREFIX.pack(FRAME_MARKER, len(header_json), payload_len) + header_json
+
+
+def split_message(buf, start: int = 0, end: Optional[int] = None) -> Optional[Tuple[int, int, Optional[int]]]:
+    """
+    Locate the message starting at offset `start` of the receive buffer `buf`
+    (a bytearray filled with sock.recv_into(), valid up to `end`, by default its length).
+    Returns a tuple of offsets (json_start, json_end, payload_end): `buf[json_start:json_end]`
+    is the JSON line or the frame's JSON header, `buf[json_end:payload_end]` is the frame's
+    raw payload. For a JSON line payload_end is None and the message ends at json_end,
+    for a frame it ends at payload_end.
+    Returns None if `buf` does not hold the whole message yet.
+    """
+    if end is None:
+        end = len(buf)
+    if start >= end:
+        return None
+
+    if buf[start] != FRAME_MARKER:
+        newline = buf.find(b'\n', start, end)
+        if newline == -1:
+            return None
+        return start, newline + 1, None
+
+    if end - start < FRAME_PREFIX.size:
+        return None
+    _, header_len, payload_len = FRAME_PREFIX.unpack_from(buf, start)
+    json_start = start + FRAME_PREFIX.size
+    json_end = json_start + header_len
+    payload_end = json_end + payload_len
+    if end < payload_end:
+        return None
+    return json_start, json_end, payload_end
@@ -1,108 +1,354 @@
+import asyncio
+import signal
 import socket
-import threading
-import json
 import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
 import protocol
 
+try:
+    import uvloop
+except ImportError:  # optional speed-up, fall back to the default asyncio event loop
+    uvloop = None
+
 HOST = '0.0.0.0'  # listen to all interfaces
 PORT = 7777
 
-# Dictionary of all active clients:
-#  username -> {'conn': socket_obj, 'addr': (ip,port), 'last_ping': timestamp}
-clients = {}
-clients_lock = threading.Lock()
+# Longest JSON line (e.g. a chat message) read from a client; longer ones are skipped
+# with an error reply
+MAX_LINE = 1024 * 1024  # bytes
+# Largest binary frame (file chunk) read from a client: header (JSON) and payload.
+# Clients send chunks of at most 256 KiB; a bigger frame drops the connection
+# before its body is read.
+MAX_FRAME_HEADER = MAX_LINE  # bytes
+MAX_FRAME_PAYLOAD = 1024 * 1024  # bytes
+
+# Limits for the registration ("connect") line: connections that do not send it
+# in time, or send an oversized one, are refused (see read_registration_line)
+REGISTRATION_TIMEOUT = 5  # seconds
+REGISTRATION_MAX_LINE = 1024  # bytes
+
+# TCP keepalive of client connections: the kernel starts probing an idle connection after
+# KEEPALIVE_IDLE seconds and drops it after KEEPALIVE_COUNT unanswered probes sent every
+# KEEPALIVE_INTERVAL seconds, so dead peers are noticed long before inactive_checker does
+KEEPALIVE_IDLE = 60
+KEEPALIVE_INTERVAL = 10
+KEEPALIVE_COUNT = 3
+
+# Maximum number of simultaneous connections (registered or not); more are refused
+MAX_CLIENTS = 4096
+
+# On shutdown, how long closed connections get to finish (e.g. flush what is being sent)
+# before they are aborted
+SHUTDOWN_TIMEOUT = 5  # seconds
+
+# Replies that never change, encoded once
+CONNECT_OK_LINE = protocol.dumps_line(protocol.build_connect_response_ok())
+SERVER_FULL_LINE = protocol.dumps_line(protocol.build_connect_response_err("server full"))
+WRONG_MESSAGE_FORMAT_LINE = protocol.dumps_line(protocol.build_error('wrong message format'))
+MISSING_RECIPIENT_LINE = protocol.dumps_line(protocol.build_error("missing recipient (to)"))
+UNKNOWN_ACTION_LINE = protocol.dumps_line(protocol.build_error('unknown action'))
+LINE_TOO_LONG_LINE = protocol.dumps_line(protocol.build_error('message too long'))
+
+
+@dataclass(slots=True)
+class Client:
+    """
+    An active (registered) client connection.
+    """
+    username: str
+    writer: asyncio.StreamWriter
+    addr: tuple
+    last_ping_ns: int  # time.monotonic_ns() of the last ping
+
+
+# Dictionary of all active clients: username -> Client
+# All handlers run on the event loop thread, so it needs no lock.
+clients: dict[str, Client] = {}
+# Copy-on-write snapshot of `clients` for broadcasts: a tuple of (username, writer) pairs,
+# replaced (never modified) by clients_changed() whenever a client joins or leaves.
+# A broadcast can keep iterating over it while clients come and go during its awaits.
+clients_snapshot: tuple[tuple[str, asyncio.StreamWriter], ...] = ()
+# user_list message of the current clients, encoded once per change of clients_snapshot
+user_list_line: bytes = protocol.dumps_line(protocol.build_user_list([]))
+# One slot per open connection, see accept_client
+connection_slots = asyncio.BoundedSemaphore(MAX_CLIENTS)
+# Task and writer of each open connection, closed on shutdown (see main)
+connections: dict[asyncio.Task[Any], asyncio.StreamWriter] = {}
+
+
+def configure_socket(sock) -> None:
+    """
+    Set the options of an accepted client socket: no Nagle delay for small
+    chat messages, and TCP keepalive (tuned where the platform allows it).
+    """
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, 'TCP_KEEPIDLE'):  # Linux
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, KEEPALIVE_COUNT)
 
 
-def send_json(conn, data: dict):
+async def send_json(writer: asyncio.StreamWriter, data: dict[str, Any]) -> None:
     """
     Write in JSON socket a line + '\n'
     """
+    await send_line(writer, protocol.dumps_line(data))
+
+
+async def send_line(writer: asyncio.StreamWriter, line: bytes) -> None:
+    """
+    Write in socket an already encoded JSON line (see protocol.dumps_line)
+    """
     try:
-        text = json.dumps(data, ensure_ascii=False) + '\n'
-        conn.sendall(text.encode('utf-8'))
+        writer.write(line)
+        await writer.drain()
     except Exception as e:
-        print(f"Error sending to {conn}: {e}")
+        print(f"Error sending to {writer.get_extra_info('peername')}: {e}")
 
 
-def broadcast_user_list():
+async def send_frame(writer: asyncio.StreamWriter, header: dict[str, Any], payload: bytes | memoryview) -> None:
     """
-    Send all connected clients a list of active users.
+    Write in socket a binary frame (JSON header + raw payload).
+    Waiting for the recipient to drain also slows down reading from the sender,
+    so a fast sender cannot pile up file chunks in the server's memory.
+    """
+    try:
+        # Header and payload are handed over separately instead of being joined into one
+        # new bytes first: transports that support it send them with a single sendmsg()
+        writer.writelines((protocol.pack_frame_header(header, len(payload)), payload))
+        await writer.drain()
+    except Exception as e:
+        print(f"Error sending to {writer.get_extra_info('peername')}: {e}")
+
+
+async def read_message(reader: asyncio.StreamReader) -> tuple[dict[str, Any] | None, memoryview | None]:
     """
-    with clients_lock:
-        user_list = list(clients.keys())
-        payload = protocol.build_user_list(user_list)
-        for username, data in clients.items():
+    Read the next message from `reader`: a JSON line or a binary frame (see protocol.py).
+    Returns a tuple (message, payload), payload being a memoryview of a binary frame's raw
+    bytes (None for JSON lines), or (None, None) once the client closed the connection.
+    Raises ValueError if the message is not valid JSON, and asyncio.LimitOverrunError
+    if a JSON line is longer than MAX_LINE; either way the stream stays aligned
+    on the next message.
+    Raises ConnectionAbortedError for a frame larger than MAX_FRAME_HEADER/MAX_FRAME_PAYLOAD,
+    without reading its body.
+    """
+    try:
+        first = await reader.readexactly(1)
+        if first[0] != protocol.FRAME_MARKER:
             try:
-                send_json(data['conn'], payload)
-            except:
-                pass
+                line = await reader.readuntil(b'\n')
+            except asyncio.LimitOverrunError:
+                await skip_line(reader)
+                raise
+            return protocol.loads(first + line), None
+
+        prefix = first + await reader.readexactly(protocol.FRAME_PREFIX.size - 1)
+        _, header_len, payload_len = protocol.FRAME_PREFIX.unpack(prefix)
+        if header_len > MAX_FRAME_HEADER or payload_len > MAX_FRAME_PAYLOAD:
+            raise ConnectionAbortedError(f"frame too large ({header_len} + {payload_len} bytes)")
+        # Header and payload in one read; both are then used in place through memoryview slices
+        body = memoryview(await reader.readexactly(header_len + payload_len))
+    except asyncio.IncompleteReadError:
+        return None, None
+    return protocol.loads(body[:header_len]), body[header_len:]
+
+
+async def skip_line(reader: asyncio.StreamReader) -> None:
+    """
+    Discard the rest of an overlong line from `reader`, up to and including its '\n',
+    without buffering more than the reader's limit at a time.
+    """
+    while True:
+        try:
+            await reader.readuntil(b'\n')
+            return
+        except asyncio.LimitOverrunError as e:
+            await reader.readexactly(e.consumed)
+
+
+def clients_changed() -> None:
+    """
+    Refresh clients_snapshot and user_list_line after adding or removing entries of `clients`.
+    """
+    global clients_snapshot, user_list_line
+    clients_snapshot = tuple((username, client.writer) for username, client in clients.items())
+    user_list_line = protocol.dumps_line(protocol.build_user_list([username for username, _ in clients_snapshot]))
+
+
+async def broadcast_user_list() -> None:
+    """
+    Send all connected clients a list of active users.
+    The list is only encoded when clients join or leave, not for every broadcast or recipient.
+    """
+    snapshot, line = clients_snapshot, user_list_line
+    for _, writer in snapshot:
+        await send_line(writer, line)
 
 
-def remove_client(username: str):
+async def remove_client(username: str) -> None:
     """
     Remove `username` from the active clients dictionary and broadcast the new list.
     """
-    with clients_lock:
-        if username in clients:
-            print(f"[REMOVE CLIENT] Removing '{username}' from active list.")
-            try:
-                clients[username]['conn'].close()
-            except Exception:
-                pass
-            del clients[username]
-    broadcast_user_list()
+    if username in clients:
+        print(f"[REMOVE CLIENT] Removing '{username}' from active list.")
+        clients.pop(username).writer.close()
+        clients_changed()
+    await broadcast_user_list()
 
 
-def register_client(conn: socket.socket, addr) -> (str | None, str | None):
+async def read_registration_line(reader: asyncio.StreamReader) -> bytes:
+    """
+    reader.readuntil(b'\n') for the registration line, but giving up as soon as
+    REGISTRATION_MAX_LINE bytes are read without a newline, instead of at the
+    reader's much larger limit (MAX_LINE).
+    Bytes are taken one at a time from the reader's buffer: the line is short and
+    read once per connection, and nothing after its newline is consumed.
     """
-    Handle the initial registration packet from a connecting socket.
-    Expects a line like: {"action":"connect","username":"desired_name"}.
+    line = bytearray()
+    while len(line) < REGISTRATION_MAX_LINE:
+        byte = await reader.read(1)
+        if not byte:
+            raise asyncio.IncompleteReadError(bytes(line), None)
+        line += byte
+        if byte == b'\n':
+            return bytes(line)
+    raise asyncio.LimitOverrunError("registration line too long", len(line))
+
+
+async def register_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                          addr: tuple) -> tuple[str | None, str | None]:
+    """
+    Handle the initial registration packet from a connecting client.
+    Expects a line like: {"action":"connect","username":"desired_name"}, of at most
+    REGISTRATION_MAX_LINE bytes and within REGISTRATION_TIMEOUT seconds.
     Returns a tuple (username, error_message):
       - If registration succeeds, returns (username, None).
-      - If registration fails (malformed JSON, missing fields, or name taken),
+      - If registration fails (malformed JSON, missing fields, name taken, too long or too late),
         returns (None, "<error_description>").
     """
     try:
-        # Wrap socket with a file‐like object for readline()
-        file_obj = conn.makefile(mode='r', encoding='utf-8')
-        line = file_obj.readline()
-        if not line:
-            return None, "no data received"
-
-        data = json.loads(line)
+        line = await asyncio.wait_for(read_registration_line(reader), REGISTRATION_TIMEOUT)
+        data = protocol.loads(line)
         if data.get('action') != protocol.ACTION_CONNECT or 'username' not in data:
             return None, "invalid connect protocol"
 
         requested_user = data['username']
-    except json.JSONDecodeError:
+    except asyncio.IncompleteReadError:
+        return None, "no data received"
+    except asyncio.LimitOverrunError:
+        return None, "registration too long"
+    except asyncio.TimeoutError:  # not yet the builtin TimeoutError before Python 3.11
+        return None, "registration timed out"
+    except ValueError:
         return None, "malformed JSON"
     except Exception as e:
         return None, f"error reading registration: {e}"
 
     # Check if username is already taken
-    with clients_lock:
-        if requested_user in clients:
-            return None, "username already taken"
-
-        # Otherwise, register the new client
-        clients[requested_user] = {
-            'conn': conn,
-            'addr': addr,
-            'last_ping': time.time()
-        }
-        print(f"[REGISTERED] '{requested_user}' from {addr}")
+    if requested_user in clients:
+        return None, "username already taken"
+
+    # Otherwise, register the new client
+    clients[requested_user] = Client(requested_user, writer, addr, time.monotonic_ns())
+    clients_changed()
+    print(f"[REGISTERED] '{requested_user}' from {addr}")
 
     return requested_user, None
 
 
-def handle_client(conn: socket.socket, addr):
+# ──────────────────────────────────────────────────────────────────────────────
+# Message handlers
+# ──────────────────────────────────────────────────────────────────────────────
+# Each handler takes (client, msg, data): the sending Client, the decoded message
+# and the raw payload of a binary frame (None for JSON lines). A handler returns
+# True to end the client's connection, False to keep reading from it.
+
+async def on_ping(client: Client, msg: dict[str, Any], data: memoryview | None) -> bool:
+    # Client heartbeat: update last_ping_ns
+    client.last_ping_ns = time.monotonic_ns()
+    return False
+
+
+async def on_message(client: Client, msg: dict[str, Any], data: memoryview | None) -> bool:
+    # Private message: {"action":"message","to":"bob","message":"Hello"}
+    target = msg.get('to')
+    text = msg.get('message', '')
+
+    if not target or not text:
+        await send_line(client.writer, WRONG_MESSAGE_FORMAT_LINE)
+        return False
+
+    recipient = clients.get(target)
+    if recipient:
+        # Forward message to the recipient
+        payload = {'action': protocol.ACTION_MESSAGE, 'from': client.username, 'message': text}
+        await send_json(recipient.writer, payload)
+    else:
+        # Recipient not found or offline
+        await send_json(client.writer, protocol.build_error(f'user {target} not found'))
+    return False
+
+
+async def on_disconnect(client: Client, msg: dict[str, Any], data: memoryview | None) -> bool:
+    # Client requested a clean disconnect
+    print(f"[DISCONNECT REQUEST] '{client.username}' requested disconnect.")
+    return True
+
+
+async def on_file_event(client: Client, msg: dict[str, Any], data: memoryview | None) -> bool:
+    # File transfer events: forward to the recipient as they are
+    target = msg.get('to')
+    if not target:
+        await send_line(client.writer, MISSING_RECIPIENT_LINE)
+        return False
+    recipient = clients.get(target)
+    if recipient:
+        # Send message to target
+        payload = msg.copy()
+        payload['from'] = client.username
+        if data is None:
+            await send_json(recipient.writer, payload)
+        else:
+            # File chunk: forward the raw bytes as a binary frame
+            await send_frame(recipient.writer, payload, data)
+    else:
+        # Recipient is not found
+        await send_json(client.writer, protocol.build_error(f'user {target} not found'))
+    return False
+
+
+async def on_unknown(client: Client, msg: dict[str, Any], data: memoryview | None) -> bool:
+    # Unknown action: inform the client
+    await send_line(client.writer, UNKNOWN_ACTION_LINE)
+    return False
+
+
+Handler = Callable[[Client, dict[str, Any], memoryview | None], Awaitable[bool]]
+
+# action -> handler; actions not listed here go to on_unknown
+HANDLERS: dict[str, Handler] = {
+    protocol.ACTION_PING: on_ping,
+    protocol.ACTION_MESSAGE: on_message,
+    protocol.ACTION_DISCONNECT: on_disconnect,
+    protocol.ACTION_FILE_REQUEST: on_file_event,
+    protocol.ACTION_FILE_ACCEPT: on_file_event,
+    protocol.ACTION_FILE_CANCEL: on_file_event,
+    protocol.ACTION_FILE_DATA: on_file_event,
+    protocol.ACTION_FILE_COMPLETE: on_file_event,
+}
+
+
+async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
     """
-    Handle all communication with a single client socket `conn`.
+    Handle all communication with a single client connection.
     Steps:
       1. Read the initial registration ("connect") packet.
       2. If registration fails, send an error and close.
       3. If succeeds, send back {"action":"connect","status":"ok"} and broadcast new user list.
-      4. Enter a loop to process incoming JSON lines:
+      4. Enter a loop to process incoming JSON lines and binary frames, each passed
+         to its action's handler in HANDLERS:
          - "ping" -> update last_ping timestamp
          - "message" -> forward to the specified recipient
          - "disconnect" -> break and clean up
@@ -111,152 +357,145 @@ def handle_client(conn: socket.socket, addr):
          - Anything else -> send back an error
       5. When loop ends (client closed or timed out), remove client and broadcast updated list.
     """
+    addr = writer.get_extra_info('peername')
     print(f"[NEW CONNECTION] Client from {addr} connected.")
+    configure_socket(writer.get_extra_info('socket'))
 
     # Register the client
-    username, err = register_client(conn, addr)
-    if not username:
-        # Registration failed: send error and close socket
-        send_json(conn, protocol.build_connect_response_err(err))
+    username, err = await register_client(reader, writer, addr)
+    if username is None:
+        # Registration failed: send error and close connection
+        err = err or "registration failed"
+        await send_json(writer, protocol.build_connect_response_err(err))
         print(f"[REGISTRATION FAILED] {addr} -> {err}")
-        conn.close()
+        writer.close()
         return
 
+    client = clients[username]
+
     # Inform client that registration succeeded
-    send_json(conn, protocol.build_connect_response_ok())
-    broadcast_user_list()
+    await send_line(writer, CONNECT_OK_LINE)
+    await broadcast_user_list()
 
-    file_obj = conn.makefile(mode='r', encoding='utf-8')
     try:
         while True:
-            line = file_obj.readline()
-            if not line:
-                # Client closed the socket
-                print(f"[DISCONNECT] '{username}' closed connection.")
-                break
-
             try:
-                msg = json.loads(line)
-            except json.JSONDecodeError:
+                msg, data = await read_message(reader)
+            except ValueError:
                 # Skip any malformed JSON
                 continue
+            except asyncio.LimitOverrunError:
+                await send_line(writer, LINE_TOO_LONG_LINE)
+                continue
 
-            action = msg.get('action')
-
-            if action == protocol.ACTION_PING:
-                # Client heartbeat: update last_ping
-                with clients_lock:
-                    if username in clients:
-                        clients[username]['last_ping'] = time.time()
-
-            elif action == protocol.ACTION_MESSAGE:
-                # Private message: {"action":"message","to":"bob","message":"Hello"}
-                target = msg.get('to')
-                text = msg.get('message', '')
-
-                if not target or not text:
-                    send_json(conn, protocol.build_error('wrong message format'))
-                    continue
-
-                with clients_lock:
-                    if target in clients:
-                        # Forward message to the recipient
-                        payload = {'action': protocol.ACTION_MESSAGE, 'from': username, 'message': text}
-                        send_json(clients[target]['conn'], payload)
-                    else:
-                        # Recipient not found or offline
-                        send_json(conn, protocol.build_error(f'user {target} not found'))
-
-            elif action == protocol.ACTION_DISCONNECT:
-                # Client requested a clean disconnect
-                print(f"[DISCONNECT REQUEST] '{username}' requested disconnect.")
+            if msg is None:
+                # Client closed the connection
+                print(f"[DISCONNECT] '{username}' closed connection.")
                 break
 
-            # File transfer events handlers
-            elif action in (
-                    protocol.ACTION_FILE_REQUEST,
-                    protocol.ACTION_FILE_ACCEPT,
-                    protocol.ACTION_FILE_CANCEL,
-                    protocol.ACTION_FILE_DATA,
-                    protocol.ACTION_FILE_COMPLETE
-            ):
-                target = msg.get('to')
-                if not target:
-                    send_json(conn, protocol.build_error("missing recipient (to)"))
-                    continue
-                with clients_lock:
-                    if target in clients:
-                        # Send message to target
-                        payload = msg.copy()
-                        payload['from'] = username
-                        send_json(clients[target]['conn'], payload)
-                    else:
-                        # Recipient is not found
-                        send_json(conn, protocol.build_error(f'user {target} not found'))
-
-            else:
-                # Unknown action: inform the client
-                send_json(conn, protocol.build_error('unknown action'))
+            handler = HANDLERS.get(msg.get('action', ''), on_unknown)
+            if await handler(client, msg, data):
+                break
 
     except Exception as e:
         print(f"[EXCEPTION] Error handling '{username}': {e}")
 
     finally:
         # Clean up
-        remove_client(username)
-        try:
-            conn.close()
-        except:
-            pass
+        if clients.get(username) is client:
+            await remove_client(username)
+        writer.close()
+
+
+async def accept_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """
+    Connection callback of the server: runs handle_client for the new connection
+    while it holds one of the MAX_CLIENTS connection slots, and refuses it with
+    a connect error if none is free.
+    """
+    if connection_slots.locked():
+        await send_line(writer, SERVER_FULL_LINE)
+        print(f"[REFUSED] {writer.get_extra_info('peername')} -> server full")
+        writer.close()
+        return
+    task = asyncio.current_task()
+    assert task is not None
+    connections[task] = writer
+    try:
+        async with connection_slots:
+            await handle_client(reader, writer)
+    finally:
+        del connections[task]
 
 
-def inactive_checker():
+async def inactive_checker() -> None:
     """
-    Background thread, which every 30 seconds checks all clients,
+    Background task, which every 30 seconds checks all clients,
     and if a client didn't ping for more than 120 seconds, doesn't count them as active.
     """
     while True:
-        time.sleep(30)
-        now = time.time()
-        removed = []
-        with clients_lock:
-            for user, data in list(clients.items()):
-                if now - data['last_ping'] > 120:
-                    print(f"[TIMEOUT] {user}")
-                    try:
-                        data['conn'].shutdown(socket.SHUT_RDWR)
-                        data['conn'].close()
-                    except:
-                        pass
-                    removed.append(user)
-                    del clients[user]
+        await asyncio.sleep(30)
+        now_ns = time.monotonic_ns()
+        # Collect only the expired names, instead of copying every (user, client) pair
+        removed = [user for user, client in clients.items() if now_ns - client.last_ping_ns > 120_000_000_000]
+        for user in removed:
+            print(f"[TIMEOUT] {user}")
+            # Closing the connection also ends the client's handle_client
+            clients.pop(user).writer.close()
         if removed:
-            broadcast_user_list()
+            clients_changed()
+            await broadcast_user_list()
 
 
-def start_server():
+async def main() -> None:
     """
-    Create a socket, listen to connections, for each run handle_client in a separate thread.
+    Listen to connections on one event loop, handling each in its own handle_client task,
+    until SIGINT or SIGTERM.
     """
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server.bind((HOST, PORT))
-    server.listen()
+    server = await asyncio.start_server(accept_client, HOST, PORT, limit=MAX_LINE)
     print(f"[STARTED] Server is listening on {HOST}: {PORT}")
 
-    # Run background thread to check inactive clients.
-    checker_thread = threading.Thread(target=inactive_checker, daemon=True)
-    checker_thread.start()
+    # Stop on SIGINT/SIGTERM. The event loop is woken up through its own self-pipe, so
+    # shutdown starts right away, whatever accept or timer the loop is waiting on.
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C still ends asyncio.run() with KeyboardInterrupt
+
+    # Run background task to check inactive clients.
+    checker_task = asyncio.create_task(inactive_checker())
 
     try:
-        while True:
-            conn, addr = server.accept()
-            client_thread = threading.Thread(target=handle_client, args=(conn, addr), daemon=True)
-            client_thread.start()
+        async with server:
+            await stop.wait()
+            print("\n[SHUTTING DOWN] Server is shutting down.")
+            # Closing the connections lets their handle_client tasks finish on their own
+            for writer in list(connections.values()):
+                writer.close()
+            if connections:
+                await asyncio.wait(list(connections), timeout=SHUTDOWN_TIMEOUT)
+            # Peers that stopped reading keep their connection from closing: drop them
+            for writer in list(connections.values()):
+                writer.transport.abort()
+            if connections:
+                await asyncio.wait(list(connections), timeout=SHUTDOWN_TIMEOUT)
+    finally:
+        checker_task.cancel()
+
+
+def start_server() -> None:
+    """
+    Run the server's event loop (uvloop's, if it is installed) until interrupted.
+    """
+    if uvloop:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    try:
+        asyncio.run(main())
     except KeyboardInterrupt:
         print("\n[SHUTTING DOWN] Server is shutting down.")
-    finally:
-        server.close()
 
 
 if __name__ == '__main__':